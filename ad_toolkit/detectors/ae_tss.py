@@ -63,25 +63,25 @@ class AutoEncoderTSS(BaseDetector):
         self.model = self.ae.model
         self._input_size = self.ae._input_size
 
-    def predict(self, data: pd.DataFrame) -> np.ndarray:
-        if self._window_size > 1:
-            input_data = self.ae._transform_data(data)
-            input_data = self.ae._data_to_tensors(input_data)
-        else:
-            input_data = self.ae._data_to_tensors(data)
-
-        encoded_values = []
+    def predict(
+            self, data: pd.DataFrame, batch_size: int = 32) -> np.ndarray:
+        input_data = self.ae._prepare_data(data)
+
+        # Shape: (n_windows, latent_size), filled one batch at a time.
+        encoded_values = np.zeros(
+            (len(input_data), self._latent_size), dtype=np.float32)
         self.ae.model.eval()
         with torch.no_grad():
-            for sample in input_data:
-                encoded = self.ae.model.encoder(sample)
-                encoded_values.append(encoded.detach().numpy())
-        encoded_values = np.array(encoded_values)
-
-        distances = [0] * self._window_size
-        distances += list(
-            self.distance(encoded_values[:-1], encoded_values[1:]))
-        return np.array(distances)
+            for start in range(0, len(input_data), batch_size):
+                batch = input_data[start:start + batch_size]
+                batch = batch.to(self.ae._device)
+                encoded_values[start:start + len(batch)] = (
+                    self.ae.model.encode(batch).cpu().numpy())
+
+        distances = np.zeros((len(data),))
+        distances[self._window_size:] = self.distance(
+            encoded_values[:-1], encoded_values[1:])
+        return distances
 
     def detect(
         self, data: pd.DataFrame, threshold: Optional[float] = None,
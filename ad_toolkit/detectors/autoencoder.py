@@ -6,7 +6,7 @@ References:
      probability" J.An, S.Cho.
 
 """
-from typing import List, Optional, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 import numpy as np
 import pandas as pd
@@ -17,8 +17,11 @@ from torch.utils.data import DataLoader
 
 from ad_toolkit.detectors.base_detector import BaseDetector
 from ad_toolkit.utils.torch_utils import (
-    build_layers, build_network, get_data_loader, train_valid_split)
-from ad_toolkit.utils import window_data
+    build_layers, build_network, compile_module, configure_cpu_threads,
+    WindowDataset, run_network, to_float_tensor, train_valid_split)
+
+# Maximum number of distinct input shapes with a cached prediction buffer.
+_MAX_BUFFERS = 4
 
 
 class _AEModel(nn.Module):
@@ -34,6 +37,9 @@ class _AEModel(nn.Module):
             input_size, layers, latent_size)
         self.decoder: nn.Module = self._get_decoder(
             latent_size, list(reversed(layers)), input_size)
+        # Linear layers of both networks, every other module is a ReLU.
+        self._encoder_layers: List[nn.Linear] = list(self.encoder[::2])
+        self._decoder_layers: List[nn.Linear] = list(self.decoder[::2])
 
     @classmethod
     def _get_encoder(
@@ -53,9 +59,15 @@ class _AEModel(nn.Module):
         decoder = build_network(nn_layers)
         return decoder
 
+    def encode(self, data: torch.Tensor) -> torch.Tensor:
+        return run_network(data, self._encoder_layers)
+
+    def decode(self, data: torch.Tensor) -> torch.Tensor:
+        return run_network(data, self._decoder_layers)
+
     def forward(self, data: torch.Tensor) -> torch.Tensor:
-        encoded = self.encoder(data)
-        decoded = self.decoder(encoded)
+        encoded = self.encode(data)
+        decoded = self.decode(encoded)
         return decoded
 
 
@@ -67,20 +79,31 @@ class AutoEncoder(BaseDetector):
         latent_size: int = 100,
         layers: Union[List[int], Tuple[int]] = (500, 200),
         use_gpu: bool = False,
+        compile_model: bool = False,
     ) -> None:
         """
 
         :param window_size:
         :param latent_size:
         :param layers:
+        :param use_gpu:
+        :param compile_model: Compile the network with `torch.compile`,
+            ignored for torch versions that do not provide it.
         """
         self.model: Optional[nn.Module] = None
         self._input_size: Optional[int] = None
         self._window_size: int = window_size
         self._latent_size: int = latent_size
         self._layers: Union[List[int], Tuple[int]] = layers
+        self._compile_model: bool = compile_model
         self._device: torch.device = torch.device(
             'cuda' if torch.cuda.is_available() and use_gpu else 'cpu')
+        # Page-locked host batches allow asynchronous copies to the GPU.
+        self._pin_memory: bool = self._device.type == 'cuda'
+        # Pinned host buffers for prediction batches, keyed by shape.
+        self._buffers: Dict[torch.Size, torch.Tensor] = {}
+        if self._device.type == 'cpu':
+            configure_cpu_threads()
 
     def train(
         self, train_data: pd.DataFrame, epochs: int = 20, batch_size: int = 32,
@@ -89,11 +112,11 @@ class AutoEncoder(BaseDetector):
     ) -> None:
 
         all_data = self._prepare_data(train_data)
-        self._init_detector(all_data)
+        self._init_detector(train_data)
 
-        all_data_tensors = self._data_to_tensors(all_data)
         train_data_loader, valid_data_loader = train_valid_split(
-            all_data_tensors, validation_portion, batch_size)
+            all_data, validation_portion, batch_size,
+            pin_memory=self._pin_memory)
 
         optimizer = torch.optim.Adam(self.model.parameters(), lr=learning_rate)
 
@@ -101,39 +124,55 @@ class AutoEncoder(BaseDetector):
             train_loss = self._train_model(train_data_loader, optimizer)
             valid_loss = self._validate_model(valid_data_loader)
             if verbose:
-                print(f"Epoch {epoch} train_loss: {train_loss}, "
-                      f"valid_loss: {valid_loss}")
+                print(f"Epoch {epoch} train_loss: {train_loss.item()}, "
+                      f"valid_loss: {valid_loss.item()}")
 
     def predict(
         self, data: pd.DataFrame, batch_size: int = 32,
         raw_errors: bool = False,
     ) -> np.ndarray:
-        if self._window_size > 1:
-            input_data = self._transform_data(data)
-            input_data = self._data_to_tensors(input_data)
-        else:
-            input_data = self._data_to_tensors(data)
+        input_data = self._prepare_data(data)
 
-        data_loader = get_data_loader(input_data, batch_size, test=True)
-        scores = []
+        if raw_errors:
+            results = np.zeros((len(data), self._input_size))
+        else:
+            results = np.zeros((len(data),))
+        # Scores are written in place, first `window_size-1` points have none.
+        offset = self._window_size - 1
         self.model.eval()
-        with torch.no_grad():
-            for batch in data_loader:
+        with torch.inference_mode():
+            for start in range(0, len(input_data), batch_size):
+                # Windows are only materialized one batch at a time.
+                batch = input_data[start:start + batch_size]
+                if self._pin_memory:
+                    batch = self._get_buffer(batch.shape).copy_(batch)
+                batch = batch.to(self._device, non_blocking=True)
                 rec = self.model.forward(batch)
                 errors = F.mse_loss(rec, batch, reduction='none')
                 if not raw_errors:
                     errors = errors.mean(1)
-                scores.append(errors.cpu().numpy())
-
-        if raw_errors:
-            results = np.zeros((len(data), self._input_size))
-        else:
-            results = np.zeros((len(data),))
-        results[self._window_size-1:] = np.concatenate(scores)
+                results[offset:offset + len(batch)] = errors.cpu().numpy()
+                offset += len(batch)
 
         return (results if not raw_errors
                 else self._errors_to_reconstruction_error(results))
 
+    def _get_buffer(self, shape: torch.Size) -> torch.Tensor:
+        """Return a reusable host buffer of the given shape, avoids allocating
+        page-locked memory for every batch in `predict`. Only the most recently
+        used shapes are kept.
+        """
+        if shape in self._buffers:
+            # Move to the end, `self._buffers` is kept in least to most
+            # recently used order.
+            self._buffers[shape] = self._buffers.pop(shape)
+        else:
+            if len(self._buffers) >= _MAX_BUFFERS:
+                del self._buffers[next(iter(self._buffers))]
+            self._buffers[shape] = torch.empty(
+                shape, pin_memory=self._pin_memory)
+        return self._buffers[shape]
+
     def _errors_to_reconstruction_error(self, errors):
         d = int(self._input_size / self._window_size)
         rec_errors = np.zeros((len(errors), d))
@@ -141,52 +180,50 @@ class AutoEncoder(BaseDetector):
             rec_errors += errors[:, i*d:(i+1)*d]
         return rec_errors / self._window_size
 
-    def _init_detector(self, all_data: pd.DataFrame) -> None:
+    def _init_detector(self, data: pd.DataFrame) -> None:
         if self._input_size is None:
-            self._input_size = len(all_data.iloc[0])
+            self._input_size = data.shape[1] * self._window_size
         self._init_model_if_needed()
 
-    def _prepare_data(self, train_data: pd.DataFrame) -> pd.DataFrame:
+    def _prepare_data(
+            self, data: pd.DataFrame) -> Union[torch.Tensor, WindowDataset]:
+        all_data = self._data_to_tensors(data)
         if self._window_size > 1:
-            all_data = self._transform_data(train_data)
-        else:
-            all_data = train_data
+            all_data = WindowDataset(all_data, self._window_size)
         return all_data
 
     def _train_model(
         self, train_data_loader: DataLoader, optimizer: torch.optim.Optimizer,
-    ) -> float:
-        epoch_loss = 0
+    ) -> torch.Tensor:
+        # Accumulated on the device to avoid synchronizing on every batch.
+        epoch_loss = torch.zeros((), device=self._device)
         self.model.train()
         for batch in train_data_loader:
-            optimizer.zero_grad()
+            batch = batch.to(self._device, non_blocking=True)
+            optimizer.zero_grad(set_to_none=True)
             reconstructed = self.model.forward(batch)
             loss = F.mse_loss(reconstructed, batch)
-            epoch_loss += loss.item()
+            epoch_loss += loss.detach()
             loss.backward()
             optimizer.step()
 
         return epoch_loss / len(train_data_loader)
 
-    def _validate_model(self, valid_data_loader: DataLoader) -> float:
-        epoch_loss = 0
+    def _validate_model(self, valid_data_loader: DataLoader) -> torch.Tensor:
         self.model.eval()
-        with torch.no_grad():
+        with torch.inference_mode():
+            epoch_loss = torch.zeros((), device=self._device)
             for batch in valid_data_loader:
+                batch = batch.to(self._device, non_blocking=True)
                 reconstructed = self.model.forward(batch)
-                loss = F.mse_loss(reconstructed, batch)
-                epoch_loss += loss.item()
+                epoch_loss += F.mse_loss(reconstructed, batch)
 
         return epoch_loss / len(valid_data_loader)
 
-    def _transform_data(self, data: pd.DataFrame) -> pd.DataFrame:
-        return window_data(data, self._window_size)
-
-    def _data_to_tensors(self, data: pd.DataFrame) -> List[torch.Tensor]:
-        tensors = [torch.Tensor(row).to(self._device)
-                   for _, row
-                   in data.iterrows()]
-        return tensors
+    def _data_to_tensors(self, data: pd.DataFrame) -> torch.Tensor:
+        # Shape: (time_steps, d). Kept on the host, batches are moved
+        # to the device by the training and prediction loops.
+        return to_float_tensor(data)
 
     def _init_model_if_needed(self) -> None:
         if self.model is not None:
@@ -196,3 +233,5 @@ class AutoEncoder(BaseDetector):
             layers=self._layers,
             latent_size=self._latent_size,
         ).to(self._device)
+        if self._compile_model:
+            self.model = compile_module(self.model)
@@ -19,8 +19,11 @@ import sklearn.metrics
 import torch
 from torch import nn
 import torch.nn.functional as F
+from torch.utils.data import DataLoader, TensorDataset
 
 from ad_toolkit.detectors.base_detector import BaseDetector
+from ad_toolkit.utils import sliding_windows
+from ad_toolkit.utils.torch_utils import configure_cpu_threads
 
 
 class LSTM_AD(BaseDetector):
@@ -45,6 +48,8 @@ class LSTM_AD(BaseDetector):
         self._error_dist = None
         self._device: torch.device = torch.device(
             'cuda' if torch.cuda.is_available() and use_gpu else 'cpu')
+        if self._device.type == 'cpu':
+            configure_cpu_threads()
 
     def train(
         self,
@@ -53,6 +58,8 @@ class LSTM_AD(BaseDetector):
         validation_steps: int = 10,
         epochs: int = 50,
         learning_rate: float = 1e-4,
+        batch_size: int = 32,
+        bptt_len: int = 100,
         verbose: bool = False,
     ) -> None:
         """
@@ -62,6 +69,9 @@ class LSTM_AD(BaseDetector):
         :param validation_steps:
         :param epochs:
         :param learning_rate:
+        :param batch_size: Number of training windows per optimization step.
+        :param bptt_len: Length of the windows the training series is split
+            into, bounds the number of steps to back-propagate through.
         :param verbose:
         :return:
         """
@@ -78,7 +88,8 @@ class LSTM_AD(BaseDetector):
         self._d_size = train_data.shape[-1]
         self._init_model_if_needed()
         # Fit model to train data.
-        self._fit_model(train_df, epochs, learning_rate, verbose)
+        self._fit_model(train_df, epochs, learning_rate, verbose,
+                        batch_size, bptt_len)
         # Compute error distribution using eval data.
         self._fit_error_distribution(eval_df)
 
@@ -171,6 +182,9 @@ class LSTM_AD(BaseDetector):
     def _init_model_if_needed(self) -> None:
         if self.model is not None:
             return
+        if self._device.type == 'cuda':
+            # Let cuDNN pick the fastest LSTM kernels for the input shapes.
+            torch.backends.cudnn.benchmark = True
         self.model = _LSTM(
             input_size=self._d_size,
             output_size=self._l_preds,
@@ -198,13 +212,13 @@ class LSTM_AD(BaseDetector):
         :param data:
         :return:
         """
-        values = np.expand_dims(data, axis=0)
-        train_data = values[:, :-self._l_preds, :]
-        train_targets = []
-        for i in range(self._l_preds-1):
-            train_targets += [values[:, 1+i:-self._l_preds+i+1, :]]
-        train_targets += [values[:, self._l_preds:, :]]
-        train_targets = np.stack(train_targets, axis=3)
+        values = np.asarray(data)
+        # Shape: (1, time_steps-l, d)
+        train_data = values[np.newaxis, :-self._l_preds, :]
+        # Strided view where train_targets[0, t, :, i] = values[t+1+i].
+        # Shape: (time_steps-l, l, d) -> (1, time_steps-l, d, l)
+        train_targets = sliding_windows(
+            values[1:], self._l_preds).transpose(0, 2, 1)[np.newaxis]
 
         train_data, train_targets = (
             self._to_tensor(train_data),
@@ -248,12 +262,50 @@ class LSTM_AD(BaseDetector):
 
     def _fit_model(
         self, train_df: pd.DataFrame, epochs: int, learning_rate: float,
-        verbose: bool,
+        verbose: bool, batch_size: int = 32, bptt_len: int = 100,
     ) -> None:
-        # Shape: (batch_size, time_steps-l, d), (batch_size, time_steps-l, d, l)
+        # Shape: (1, time_steps-l, d), (1, time_steps-l, d, l)
         train_data, train_targets = self._transform_train_data_target(train_df)
-        self._train_model(train_data, train_targets, epochs, learning_rate,
-                          verbose)
+        # Shape: (n_windows, bptt_len, d), (n_windows, bptt_len, d, l)
+        train_data, train_targets = self._split_into_windows(
+            train_data, train_targets, bptt_len)
+        data_loader = DataLoader(
+            TensorDataset(train_data, train_targets),
+            batch_size=batch_size,
+            shuffle=True,
+        )
+        self._train_model(data_loader, epochs, learning_rate, verbose)
+
+    @classmethod
+    def _split_into_windows(
+        cls, train_data: torch.Tensor, train_targets: torch.Tensor,
+        window_len: int,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Splits a single training sequence into windows overlapping by half
+        of their length, stacked along the batch dimension. The last window
+        always ends at the final time step, so every step is trained on.
+        Sequences shorter than `window_len` are returned as a single window.
+
+        :param train_data:
+        :param train_targets:
+        :param window_len:
+        :return:
+        """
+        time_steps = train_data.size(1)
+        window_len = min(window_len, time_steps)
+        stride = max(1, window_len // 2)
+        last_start = time_steps - window_len
+        starts = list(range(0, last_start + 1, stride))
+        if starts[-1] != last_start:
+            starts.append(last_start)
+        starts = torch.tensor(starts, device=train_data.device)
+        # Shape: (n_windows, d, window_len) -> (n_windows, window_len, d)
+        data_windows = train_data[0].unfold(0, window_len, 1)[starts]
+        data_windows = data_windows.permute(0, 2, 1)
+        # Shape: (n_windows, d, l, window_len) -> (n_windows, window_len, d, l)
+        target_windows = train_targets[0].unfold(0, window_len, 1)[starts]
+        target_windows = target_windows.permute(0, 3, 1, 2)
+        return data_windows, target_windows
 
     def _fit_error_distribution(self, data: pd.DataFrame):
         # Shape: (time_steps-l, d), (time_steps-2*l, d)
@@ -264,19 +316,23 @@ class LSTM_AD(BaseDetector):
         self._error_dist.fit(outputs.cpu().detach().numpy(), eval_targets)
 
     def _train_model(
-        self, train_data: torch.Tensor, train_targets: torch.Tensor,
-        epochs: int, learning_rate: float, verbose: bool,
+        self, data_loader: DataLoader, epochs: int, learning_rate: float,
+        verbose: bool,
     ) -> None:
         optimizer = torch.optim.Adam(self.model.parameters(), lr=learning_rate)
         self.model.train()
         for epoch in range(epochs):
-            optimizer.zero_grad()
-            outputs = self._get_model_outputs(train_data)
-            loss = F.mse_loss(outputs, train_targets)
-            loss.backward()
-            optimizer.step()
+            epoch_loss = torch.zeros((), device=self._device)
+            for inputs, targets in data_loader:
+                optimizer.zero_grad(set_to_none=True)
+                outputs = self._get_model_outputs(inputs)
+                loss = F.mse_loss(outputs, targets)
+                loss.backward()
+                optimizer.step()
+                epoch_loss += loss.detach()
             if verbose:
-                print(f"Epoch {epoch} loss: {loss.item()}")
+                print(f"Epoch {epoch} loss: "
+                      f"{epoch_loss.item() / len(data_loader)}")
 
     def _get_scores(self, data: pd.DataFrame, errors: np.ndarray) -> np.ndarray:
         p = self._error_dist(errors)
@@ -303,63 +359,42 @@ class LSTM_AD(BaseDetector):
 class _LSTM(nn.Module):
     def __init__(
         self, input_size: int, output_size: int, hidden_size: int,
-        device: torch.device, batch_size: int = 1,
+        device: torch.device,
     ) -> None:
         super().__init__()
         self._device = device
         self._d_size = input_size
         self._l_preds = output_size
-        self.batch_size = batch_size
         self.hidden_size = hidden_size
-        self.lstm_layer_1 = nn.LSTMCell(
-            input_size, self.hidden_size)
-        self.lstm_layer_2 = nn.LSTMCell(
-            self.hidden_size, self.hidden_size)
+        # Two stacked layers run as a single (cuDNN on GPU) kernel call.
+        self.lstm = nn.LSTM(
+            input_size, self.hidden_size, num_layers=2, batch_first=True)
         self.linear = nn.Linear(
             self.hidden_size, input_size * output_size)
         self.to(self._device)
 
     def forward(self, inputs: torch.Tensor) -> torch.Tensor:
-        outputs = []
-        h_t = torch.zeros(
-            self.batch_size, self.hidden_size).double().to(self._device)
-        c_t = torch.zeros(
-            self.batch_size, self.hidden_size).double().to(self._device)
-        h_t2 = torch.zeros(
-            self.batch_size, self.hidden_size).double().to(self._device)
-        c_t2 = torch.zeros(
-            self.batch_size, self.hidden_size).double().to(self._device)
-
-        for input_t in inputs.chunk(inputs.size(1), dim=1):
-            h_t, c_t = self.lstm_layer_1(input_t.squeeze(dim=1), (h_t, c_t))
-            h_t2, c_t2 = self.lstm_layer_2(h_t, (h_t2, c_t2))
-            output = self.linear(h_t2)
-            outputs += [output]
-        outputs = torch.stack(outputs, 1).squeeze()
-
+        # Shape: (batch_size, time_steps, hidden_size), zero initial states.
+        hidden, _ = self.lstm(inputs)
+        outputs = self.linear(hidden)
+        # Shape: (batch_size, time_steps, d*l) -> (batch_size, time_steps, d, l)
         return outputs.view(
             inputs.size(0), inputs.size(1), self._d_size, self._l_preds)
 
-    def __call__(self, inputs: torch.Tensor) -> torch.Tensor:
-        return self.forward(inputs)
-
 
 class _ErrorDistribution:
 
     def __init__(self, n_dims: int, l_preds: int) -> None:
         self._d_size: int = n_dims
         self._l_preds: int = l_preds
-        self._dist: scipy.stats.multivariate_normal = None
+        # Frozen distribution, keeps the decomposition of the covariance
+        # matrix computed once at fit time.
+        self._dist: Optional[scipy.stats.multivariate_normal] = None
         self.means = None
         self.cov = None
 
     def __call__(self, errors: np.ndarray) -> np.ndarray:
-        return -scipy.stats.multivariate_normal.logpdf(
-            errors,
-            mean=self.means,
-            cov=self.cov,
-            allow_singular=True,
-        )
+        return -self._dist.logpdf(errors)
 
     def get_errors(
             self, output: np.ndarray, target: np.ndarray) -> np.ndarray:
@@ -411,3 +446,5 @@ class _ErrorDistribution:
         mean = np.mean(sample, axis=0)
         cov = np.cov(sample, rowvar=False)
         self.means, self.cov = mean, cov
+        self._dist = scipy.stats.multivariate_normal(
+            mean=mean, cov=cov, allow_singular=True)
@@ -8,7 +8,6 @@ References:
       https://github.com/KDD-OpenSource/DeepADoTS/blob/master/src/algorithms/lstm_enc_dec_axl.py
 
 """
-import functools
 from typing import List, Optional, Tuple
 
 import numpy as np
@@ -21,7 +20,8 @@ import torch.nn.functional as F
 from torch.utils.data import DataLoader
 
 from ad_toolkit.detectors.base_detector import BaseDetector
-from ad_toolkit.utils.torch_utils import get_data_loader, train_valid_split
+from ad_toolkit.utils.torch_utils import (
+    configure_cpu_threads, get_data_loader, train_valid_split)
 
 
 class LSTM_ED(BaseDetector):
@@ -45,6 +45,8 @@ class LSTM_ED(BaseDetector):
         self._threshold: float = threshold
         self._device: torch.device = torch.device(
             'cuda' if torch.cuda.is_available() and use_gpu else 'cpu')
+        if self._device.type == 'cpu':
+            configure_cpu_threads()
 
     def train(
         self,
@@ -139,18 +141,18 @@ class LSTM_ED(BaseDetector):
         optimizer = torch.optim.Adam(self.model.parameters(), lr=learning_rate)
         self.model.train()
         for epoch in range(epochs):
-            epoch_loss = 0
+            epoch_loss = torch.zeros((), device=self._device)
             for inputs in train_data_loader:
                 inputs = inputs.float().to(self._device)
-                optimizer.zero_grad()
+                optimizer.zero_grad(set_to_none=True)
                 output = self.model.forward(inputs)
                 loss = F.mse_loss(output, inputs, reduction='sum')
-                epoch_loss += loss.item() / len(inputs)
+                epoch_loss += loss.detach() / len(inputs)
                 loss.backward()
                 optimizer.step()
             if verbose:
                 print(f"Epoch {epoch} loss: "
-                      f"{epoch_loss / len(train_data_loader)}")
+                      f"{epoch_loss.item() / len(train_data_loader)}")
 
     def _fit_error_distribution(self, data_loader: DataLoader) -> None:
         """Fit multivariate gaussian distribution to a given sample using
@@ -168,12 +170,9 @@ class LSTM_ED(BaseDetector):
         means = np.mean(error_vectors, axis=0)
         cov = np.cov(error_vectors, rowvar=False)
 
-        self._dist = functools.partial(
-            scipy.stats.multivariate_normal.logpdf,
-            mean=means,
-            cov=cov,
-            allow_singular=True,
-        )
+        # Frozen distribution decomposes the covariance matrix only once.
+        self._dist = scipy.stats.multivariate_normal(
+            mean=means, cov=cov, allow_singular=True).logpdf
 
     def _compute_errors(self, data_loader: DataLoader) -> List[np.ndarray]:
         error_vectors = []
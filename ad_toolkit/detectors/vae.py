@@ -19,8 +19,8 @@ from torch.utils.data import DataLoader
 
 from ad_toolkit.detectors.base_detector import BaseDetector
 from ad_toolkit.utils.torch_utils import (
-    build_layers, build_network, train_valid_split)
-from ad_toolkit.utils import window_data
+    WindowDataset, build_layers, build_network, configure_cpu_threads,
+    to_float_tensor, train_valid_split)
 
 
 class _VAE(nn.Module):
@@ -132,6 +132,8 @@ class VariationalAutoEncoder(BaseDetector):
         self._l_samples: int = l_samples
         self._device: torch.device = torch.device(
             'cuda' if torch.cuda.is_available() and use_gpu else 'cpu')
+        if self._device.type == 'cpu':
+            configure_cpu_threads()
 
     def train(
         self, train_data: pd.DataFrame, epochs: int = 30, batch_size: int = 32,
@@ -149,56 +151,63 @@ class VariationalAutoEncoder(BaseDetector):
             train_loss = self._train_model(train_data_loader, optimizer)
             valid_loss = self._validate_model(valid_data_loader)
             if verbose:
-                print(f"Epoch {epoch} train_loss: {train_loss}, "
-                      f"valid_loss: {valid_loss}")
-
-    def _prepare_data(self, train_data: pd.DataFrame) -> List[torch.Tensor]:
-        all_data = self._transform_data(train_data)
-        all_data_tensors = self._data_to_tensors(all_data)
+                print(f"Epoch {epoch} train_loss: {train_loss.item()}, "
+                      f"valid_loss: {valid_loss.item()}")
+
+    def _prepare_data(
+            self, data: pd.DataFrame) -> Union[torch.Tensor, WindowDataset]:
+        # With `window_size` 1 the rows are used as samples directly.
+        all_data_tensors = self._data_to_tensors(data)
+        if self._window_size > 1:
+            all_data_tensors = WindowDataset(
+                all_data_tensors, self._window_size)
         return all_data_tensors
 
     def predict(
-            self, data: pd.DataFrame, raw_errors: bool = False) -> np.ndarray:
-        all_data_tensors = self._prepare_data(data)
-        scores = []
+        self, data: pd.DataFrame, raw_errors: bool = False,
+        batch_size: int = 32,
+    ) -> np.ndarray:
+        input_data = self._prepare_data(data)
+
+        if raw_errors:
+            results = np.zeros(data.shape)
+        else:
+            results = np.zeros((len(data),))
+        # Scores are written in place, first `window_size-1` points have none.
+        offset = self._window_size - 1
         self.model.eval()
         with torch.no_grad():
-            for x in all_data_tensors:
+            for start in range(0, len(input_data), batch_size):
+                # Shape: (batch_size, input_size)
+                x = input_data[start:start + batch_size]
                 mu, log_var = self.model.encode(x)
+                errors = self._reconstruction_errors(x, mu, log_var)
                 if raw_errors:
-                    score = self._raw_error(x, mu, log_var)
+                    scores = self._raw_error(errors)
                 else:
-                    score = self._simple_error(x, mu, log_var)
-                scores.append(score)
+                    scores = errors.mean(dim=1)
+                results[offset:offset + len(x)] = scores.cpu().numpy()
+                offset += len(x)
 
-        if raw_errors:
-            results = np.zeros(data.shape)
-        else:
-            results = np.zeros((len(data),))
-        results[self._window_size-1:] = scores
         return results
 
-    def _simple_error(self, x, mu, log_var):
-        score = 0
+    def _reconstruction_errors(
+        self, x: torch.Tensor, mu: torch.Tensor, log_var: torch.Tensor,
+    ) -> torch.Tensor:
+        """Squared reconstruction errors of every sample in `x`, averaged
+        over `self._l_samples` draws from the latent distribution.
+        """
+        errors = torch.zeros_like(x)
         for i in range(self._l_samples):
             z = self.model.reparametrize(mu, log_var)
             x_hat = self.model.decode(z)
-            score += F.mse_loss(x_hat, x).item()
-        return score / self._l_samples
+            errors += F.mse_loss(x_hat, x, reduction='none')
+        return errors / self._l_samples
 
-    def _raw_error(self, x, mu, log_var):
-        errors = np.zeros((self._input_size, ))
-        for i in range(self._l_samples):
-            z = self.model.reparametrize(mu, log_var)
-            x_hat = self.model.decode(z)
-            error = F.mse_loss(x_hat, x, reduction='none').cpu().numpy()
-            error /= self._l_samples
-            errors += error
+    def _raw_error(self, errors: torch.Tensor) -> torch.Tensor:
+        # Average errors of each data point over the windows containing it.
         d = int(self._input_size / self._window_size)
-        res = np.zeros((d, ))
-        for i in range(self._window_size):
-            res += errors[i*d:(i+1)*d]
-        return res / self._window_size
+        return errors.view(-1, self._window_size, d).mean(dim=1)
 
     def _init_detector(self, all_data_tensors):
         if self._input_size is None:
@@ -207,37 +216,32 @@ class VariationalAutoEncoder(BaseDetector):
 
     def _train_model(
         self, train_data_loader: DataLoader, optimizer: torch.optim.Optimizer,
-    ) -> float:
-        total_loss = 0
+    ) -> torch.Tensor:
+        total_loss = torch.zeros((), device=self._device)
         self.model.train()
         for batch in train_data_loader:
-            optimizer.zero_grad()
+            optimizer.zero_grad(set_to_none=True)
             model_outputs = self.model.forward(batch)
             loss = self.model.loss_function(model_outputs)
             loss.backward()
             optimizer.step()
-            total_loss += loss.item()
+            total_loss += loss.detach()
         return total_loss / len(train_data_loader)
 
-    def _validate_model(self, valid_data_loader: DataLoader) -> float:
-        total_loss = 0
+    def _validate_model(self, valid_data_loader: DataLoader) -> torch.Tensor:
+        total_loss = torch.zeros((), device=self._device)
         self.model.eval()
         with torch.no_grad():
             for batch in valid_data_loader:
                 model_outputs = self.model.forward(batch)
                 loss = self.model.loss_function(model_outputs)
-                total_loss += loss.item()
+                total_loss += loss
 
         return total_loss / len(valid_data_loader)
 
-    def _transform_data(self, data: pd.DataFrame) -> pd.DataFrame:
-        return window_data(data, self._window_size)
-
-    def _data_to_tensors(self, data: pd.DataFrame) -> List[torch.Tensor]:
-        tensors = [torch.Tensor(row).to(self._device)
-                   for _, row
-                   in data.iterrows()]
-        return tensors
+    def _data_to_tensors(self, data: pd.DataFrame) -> torch.Tensor:
+        # Shape: (time_steps, d)
+        return to_float_tensor(data).to(self._device)
 
     def _init_model_if_needed(self) -> None:
         if self.model is not None:
@@ -1,5 +1,6 @@
-from .preprocessor import window_data
+from .preprocessor import sliding_windows, window_data
 
 __all__ = [
+    'sliding_windows',
     'window_data',
 ]
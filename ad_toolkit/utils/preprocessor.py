@@ -1,14 +1,35 @@
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+
+def sliding_windows(values: np.ndarray, window_size: int) -> np.ndarray:
+    """Read-only strided view of consecutive windows over the first axis
+    of `values`, such that `windows[i] == values[i:i + window_size]`.
+    Built with `as_strided` to support numpy versions older than 1.20.
+
+    :param values: Array of shape (time_steps, ...).
+    :param window_size:
+    :return: Array of shape (time_steps - window_size + 1, window_size, ...).
+    """
+    values = np.asarray(values)
+    n_windows = len(values) - window_size + 1
+    return as_strided(
+        values,
+        shape=(n_windows, window_size) + values.shape[1:],
+        strides=(values.strides[0], ) + values.strides,
+        writeable=False,
+    )
 
 
 def window_data(data: pd.DataFrame, window_size: int) -> pd.DataFrame:
     if window_size < 2:
         return data
-    windowed_data = []
-    for i in range(len(data) - window_size + 1):
-        windowed_data.append(
-            np.array(data[i:i + window_size]).flatten()
-        )
     index = data.index[window_size-1:]
+    if len(data) < window_size:
+        return pd.DataFrame(data=[], index=index)
+    # Shape: (n_windows, window_size, d), a strided view over the values.
+    windows = sliding_windows(data.to_numpy(), window_size)
+    # Flatten each window row by row, as in `values[i:i + window_size]`.
+    windowed_data = windows.reshape(len(index), -1)
     return pd.DataFrame(data=windowed_data, index=index)
@@ -1,10 +1,39 @@
 import math
+import os
 from typing import List, Tuple, Union
 
 import numpy as np
+import pandas as pd
 import torch
 from torch import nn
-from torch.utils.data import DataLoader, SubsetRandomSampler
+from torch.nn import functional as F
+from torch.utils.data import Dataset, DataLoader, Subset, SubsetRandomSampler
+
+
+# Number of CPU threads used by torch, either an integer or 'auto'.
+NUM_THREADS_ENV = 'AD_TOOLKIT_NUM_THREADS'
+_cpu_threads_configured = False
+
+
+def configure_cpu_threads() -> None:
+    """Size the torch intra-op thread pool according to the
+    `AD_TOOLKIT_NUM_THREADS` environment variable, 'auto' uses half of the
+    available cores. Small networks are dominated by dispatch overhead and
+    slow down when spread over all cores. Applied once per process, no-op if
+    the variable is unset.
+    """
+    global _cpu_threads_configured
+    num_threads = os.environ.get(NUM_THREADS_ENV)
+    if _cpu_threads_configured or not num_threads:
+        return
+    if num_threads == 'auto':
+        num_threads = max(1, (os.cpu_count() or 1) // 2)
+    else:
+        num_threads = int(num_threads)
+    # The inter-op pool is left alone, resizing it once it is in use aborts
+    # the process in older torch versions (e.g. 1.13) instead of raising.
+    torch.set_num_threads(num_threads)
+    _cpu_threads_configured = True
 
 
 def build_layers(input_size, layers, output_size):
@@ -36,9 +65,64 @@ def build_network(layers: List[nn.Module]) -> nn.Sequential:
     return nn.Sequential(*network)
 
 
+def run_network(
+        data: torch.Tensor, layers: List[nn.Linear]) -> torch.Tensor:
+    """Functional equivalent of `build_network(layers)(data)`. Calls linear
+    layers directly and applies ReLU in place, skipping the per-module
+    dispatch of `nn.Sequential`.
+    """
+    for layer in layers[:-1]:
+        data = F.relu_(F.linear(data, layer.weight, layer.bias))
+    return F.linear(data, layers[-1].weight, layers[-1].bias)
+
+
+def compile_module(
+        module: nn.Module, mode: str = 'reduce-overhead') -> nn.Module:
+    """Compile `module` with `torch.compile` if the installed torch version
+    provides it (>= 2.0), otherwise return it unchanged. Attribute access
+    on the compiled module is forwarded to the original one.
+    """
+    if not hasattr(torch, 'compile'):
+        return module
+    return torch.compile(module, mode=mode)
+
+
+def to_float_tensor(data: pd.DataFrame) -> torch.Tensor:
+    """Convert `data` into a single float32 tensor, sharing memory with the
+    frame whenever its values already are a writable float32 array.
+    """
+    values = data.to_numpy(dtype=np.float32, copy=False)
+    # Copy-on-write pandas hands out read-only views, which torch can't wrap.
+    values = np.require(values, requirements='W')
+    return torch.from_numpy(values)
+
+
+class WindowDataset(Dataset):
+
+    def __init__(self, data: torch.Tensor, window_size: int) -> None:
+        """Sliding windows over rows of `data`, each flattened into a single
+        vector as in `window_data`. Windows are strided views over `data`
+        and only the accessed ones are copied, so the full
+        (n_windows, window_size * d) matrix is never materialized.
+
+        :param data: Tensor of shape (time_steps, d).
+        :param window_size:
+        """
+        # Shape: (n_windows, window_size, d)
+        self._windows: torch.Tensor = data.unfold(
+            0, window_size, 1).transpose(1, 2)
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    def __getitem__(self, index: Union[int, slice]) -> torch.Tensor:
+        # Shape: (window_size * d, ) or (n_windows, window_size * d) for slices
+        return self._windows[index].flatten(start_dim=-2)
+
+
 def get_data_loader(
-    data: Union[List[torch.Tensor], List[np.ndarray]], batch_size: int,
-    test: bool = False,
+    data: Union[Dataset, torch.Tensor, List[torch.Tensor], List[np.ndarray]],
+    batch_size: int, test: bool = False, pin_memory: bool = False,
 ) -> DataLoader:
     if test:
         sampler = None
@@ -51,19 +135,22 @@ def get_data_loader(
         batch_size=min(len(data), batch_size),
         drop_last=not test,
         sampler=sampler,
+        pin_memory=pin_memory,
     )
 
 
 def train_valid_split(
-    data: Union[List[torch.Tensor], List[np.ndarray]],
-    validation_portion: float, batch_size: int,
+    data: Union[Dataset, torch.Tensor, List[torch.Tensor], List[np.ndarray]],
+    validation_portion: float, batch_size: int, pin_memory: bool = False,
 ) -> Tuple[DataLoader, DataLoader]:
 
     split = math.ceil(validation_portion * len(data))
-    train_data = data[:split]
-    valid_data = data[split:]
+    train_data = Subset(data, range(split))
+    valid_data = Subset(data, range(split, len(data)))
 
-    train_data_loader = get_data_loader(train_data, batch_size)
-    valid_data_loader = get_data_loader(valid_data, batch_size)
+    train_data_loader = get_data_loader(
+        train_data, batch_size, pin_memory=pin_memory)
+    valid_data_loader = get_data_loader(
+        valid_data, batch_size, pin_memory=pin_memory)
 
     return train_data_loader, valid_data_loader
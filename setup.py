@@ -16,7 +16,7 @@ REQUIREMENTS: dict = {
         'requests',
         'scipy',
         'scikit-learn',
-        'torch',
+        'torch>=1.9',  # torch.inference_mode
         'torchvision',
     ],
     'donut': [
@@ -61,3 +61,14 @@ def test_train_detect_ae_tss(data, window_size):
     p = ae.detect(data)
     assert len(p) == len(data)
     assert all(pp in (0, 1) for pp in p)
+
+
+@pytest.mark.parametrize("batch_size", (1, 7, 1000))
+def test_predict_ae_tss_in_batches(batch_size):
+    data = datasets[3]
+    ae = AutoEncoderTSS(window_size=3, latent_size=10)
+    ae.train(data, epochs=1)
+
+    p = ae.predict(data, batch_size=batch_size)
+    assert len(p) == len(data)
+    assert np.all(p[:3] == 0)
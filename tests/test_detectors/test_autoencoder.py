@@ -1,6 +1,7 @@
 import numpy as np
 import pandas as pd
 import pytest
+import torch
 
 from ad_toolkit.detectors import AutoEncoder
 
@@ -61,3 +62,43 @@ def test_train_predict_raw_errors_auto_encoder(data, window_size):
 
     p = ae.predict(data, raw_errors=True)
     assert p.shape == data.shape
+
+
+@pytest.mark.parametrize("data", datasets[:2])
+def test_train_predict_compiled_auto_encoder(data):
+    ae = AutoEncoder(window_size=3, compile_model=True)
+    ae.train(data, epochs=2)
+
+    p = ae.predict(data)
+    assert len(p) == len(data)
+
+
+def test_auto_encoder_reuses_prediction_buffers():
+    ae = AutoEncoder(window_size=1)
+    buffer = ae._get_buffer((10, 5))
+    assert ae._get_buffer((10, 5)) is buffer
+    for i in range(1, 10):
+        ae._get_buffer((i, 5))
+    assert len(ae._buffers) <= 4
+    assert (10, 5) not in ae._buffers
+
+
+def test_auto_encoder_keeps_recently_used_buffers():
+    ae = AutoEncoder(window_size=1)
+    buffer = ae._get_buffer((10, 5))
+    for i in range(1, 10):
+        ae._get_buffer((i, 5))
+        assert ae._get_buffer((10, 5)) is buffer
+    assert len(ae._buffers) <= 4
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="requires CUDA")
+@pytest.mark.parametrize("data", datasets)
+def test_predict_auto_encoder_pinned_buffers(data):
+    ae = AutoEncoder(window_size=3, use_gpu=True)
+    ae.train(data, epochs=1)
+
+    p = ae.predict(data, batch_size=4)
+    assert len(p) == len(data)
+    assert ae._buffers
+    assert all(buffer.is_pinned() for buffer in ae._buffers.values())
@@ -1,6 +1,7 @@
 import numpy as np
 import pandas as pd
 import pytest
+import torch
 
 from ad_toolkit.detectors import LSTM_AD
 
@@ -22,6 +23,29 @@ def test_train_lstm(data, window_size, hidden_size, use_gpu):
     lstm.train(data, epochs=2)
 
 
+@pytest.mark.parametrize("bptt_len", (1, 16, 1000))
+@pytest.mark.parametrize("batch_size", (1, 4))
+def test_train_lstm_bptt_windows(bptt_len, batch_size):
+    data = pd.DataFrame(np.random.random((200, 5)))
+    lstm = LSTM_AD(window_size=5)
+    lstm.train(data, epochs=2, batch_size=batch_size, bptt_len=bptt_len)
+    scores = lstm.predict(data)
+    assert len(scores) == len(data)
+
+
+@pytest.mark.parametrize("time_steps", (1, 16, 100, 135, 1000))
+@pytest.mark.parametrize("bptt_len", (1, 16, 100, 1000))
+def test_bptt_windows_cover_all_time_steps(time_steps, bptt_len):
+    steps = torch.arange(time_steps, dtype=torch.float64)
+    train_data = steps.view(1, time_steps, 1)
+    train_targets = steps.view(1, time_steps, 1, 1)
+    data_windows, target_windows = LSTM_AD._split_into_windows(
+        train_data, train_targets, bptt_len)
+    assert data_windows.shape[1:] == (min(bptt_len, time_steps), 1)
+    assert torch.equal(data_windows, target_windows[..., 0])
+    assert set(data_windows.flatten().tolist()) == set(steps.tolist())
+
+
 @pytest.mark.parametrize("window_size", (5, 10))
 @pytest.mark.parametrize("hidden_size", (10, 20))
 @pytest.mark.parametrize("use_gpu", (True, False))
@@ -63,3 +63,16 @@ def test_train_predict_raw_errors_vae(data, window_size):
 
     p = vae.predict(data, raw_errors=True)
     assert p.shape == data.shape
+
+
+@pytest.mark.parametrize("batch_size", (1, 7, 1000))
+@pytest.mark.parametrize("raw_errors", (False, True))
+def test_predict_vae_in_batches(batch_size, raw_errors):
+    data = datasets[3]
+    vae = VariationalAutoEncoder(window_size=3)
+    vae.train(data, epochs=1)
+
+    p = vae.predict(data, raw_errors=raw_errors, batch_size=batch_size)
+    assert p.shape == (data.shape if raw_errors else (len(data), ))
+    assert np.all(p[:2] == 0)
+    assert np.all(p[2:] > 0)
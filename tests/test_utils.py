@@ -1,12 +1,16 @@
 import datetime
+import os
 
 import numpy as np
 import pandas as pd
 import pytest
+import torch
 from torch import nn
 
-from ad_toolkit.utils import window_data
-from ad_toolkit.utils.torch_utils import build_layers, build_network
+from ad_toolkit.utils import sliding_windows, torch_utils, window_data
+from ad_toolkit.utils.torch_utils import (
+    WindowDataset, build_layers, build_network, run_network,
+    to_float_tensor)
 
 
 def time_stamps(n_steps):
@@ -99,3 +103,83 @@ def test_build_network(layers):
         for (l, ll)
         in zip(linear_layers, layers)
     )
+
+
+@pytest.mark.parametrize("inputs,inner,outputs", (
+    (1, (), 2),
+    (10, (20, ), 10),
+    (10, (20, 30, 40), 10),
+))
+def test_run_network_matches_build_network(inputs, inner, outputs):
+    layers = build_layers(inputs, inner, outputs)
+    network = build_network(layers)
+    data = torch.randn(8, inputs)
+    with torch.no_grad():
+        assert torch.allclose(run_network(data, layers), network(data))
+
+
+@pytest.mark.parametrize("data", (
+    pd.DataFrame(data=np.random.random((10, 1))),
+    pd.DataFrame(data=np.random.random((20, 7)).astype(np.float32)),
+    pd.DataFrame(data=[[1, 2], [3, 4]]),
+))
+def test_to_float_tensor(data):
+    tensor = to_float_tensor(data)
+    assert tensor.dtype == torch.float32
+    assert tensor.shape == data.shape
+    assert np.allclose(tensor.numpy(), data.values)
+
+
+@pytest.mark.parametrize("value,expected", (
+    ('1', 1),
+    ('auto', max(1, (os.cpu_count() or 1) // 2)),
+))
+def test_configure_cpu_threads(monkeypatch, value, expected):
+    num_threads = torch.get_num_threads()
+    monkeypatch.setattr(torch_utils, '_cpu_threads_configured', False)
+    monkeypatch.setenv(torch_utils.NUM_THREADS_ENV, value)
+    try:
+        # Start from a different size, so that the call has to resize.
+        torch.set_num_threads(expected + 1)
+        torch_utils.configure_cpu_threads()
+        assert torch_utils._cpu_threads_configured
+        assert torch.get_num_threads() == expected
+        # Only the first call in a process applies the variable.
+        monkeypatch.setenv(torch_utils.NUM_THREADS_ENV, str(expected + 1))
+        torch_utils.configure_cpu_threads()
+        assert torch.get_num_threads() == expected
+    finally:
+        torch.set_num_threads(num_threads)
+
+
+def test_configure_cpu_threads_without_variable(monkeypatch):
+    num_threads = torch.get_num_threads()
+    monkeypatch.setattr(torch_utils, '_cpu_threads_configured', False)
+    monkeypatch.delenv(torch_utils.NUM_THREADS_ENV, raising=False)
+    torch_utils.configure_cpu_threads()
+    assert not torch_utils._cpu_threads_configured
+    assert torch.get_num_threads() == num_threads
+
+
+@pytest.mark.parametrize("data", (
+    pd.DataFrame(data=np.random.random((10, 1))),
+    pd.DataFrame(data=np.random.random((20, 7))),
+))
+@pytest.mark.parametrize("window_size", (1, 3, 10))
+def test_window_dataset_matches_window_data(data, window_size):
+    dataset = WindowDataset(to_float_tensor(data), window_size)
+    expected = window_data(data, window_size).values
+    assert len(dataset) == len(expected)
+    assert np.allclose(dataset[:].numpy(), expected)
+    assert np.allclose(dataset[len(dataset) - 1].numpy(), expected[-1])
+
+
+@pytest.mark.parametrize("shape", ((10, ), (10, 1), (20, 7)))
+@pytest.mark.parametrize("window_size", (1, 3, 10))
+def test_sliding_windows(shape, window_size):
+    values = np.random.random(shape)
+    windows = sliding_windows(values, window_size)
+    assert windows.shape == (
+        shape[0] - window_size + 1, window_size, *shape[1:])
+    for i in range(len(windows)):
+        assert np.array_equal(windows[i], values[i:i + window_size])